@@ -0,0 +1,169 @@
+"""kcsapi通信的抓取日志。
+日志文件是只追加的二进制文件，以`magic`开头，之后是连续的记录。每条记录由`header`定义的定长头部和三段变长数据组成：
+action、去掉api_token之后的请求体、zlib压缩后的响应体。api_token本身不会写入日志，只保留加盐后的CRC32作为会话标识，
+用于在回放时区分不同的用户。请求体和响应体中`scrub_fields`列出的提督信息字段（ID、昵称、签名、舰队名等）会被替换成等长的
+占位值；这只覆盖已知的字段，抓取日志仍可能包含其他玩家数据，不应公开分享。
+响应体在线程池中以最快的压缩级别压缩，压缩完成后在事件循环中用一次write追加到文件，不会阻塞其他请求。
+"""
+
+import asyncio
+import collections
+import functools
+import json
+import os
+import struct
+import zlib
+from urllib.parse import urlencode
+
+# 日志文件头
+magic = b'OOICAP1\n'
+
+# 记录头部：发起请求的时间戳、会话标识、上游状态码、上游耗时（秒）、action长度、请求体长度、响应体长度、响应体压缩后长度
+header = struct.Struct('<dIHfHIII')
+
+# 抓取时替换掉的提督信息字段
+scrub_fields = frozenset(['api_member_id', 'api_nickname', 'api_nickname_id', 'api_comment', 'api_comment_id',
+                          'api_deckname', 'api_enemy_id', 'api_enemy_name', 'api_enemy_nickname',
+                          'api_enemy_comment', 'api_enemy_deckname', 'api_friend_name'])
+
+CaptureRecord = collections.namedtuple('CaptureRecord', ['timestamp', 'session', 'status', 'elapsed', 'action',
+                                                         'request_body', 'response_size', 'response_body'])
+
+
+def _placeholder(value):
+    if isinstance(value, bool):
+        return value
+    if isinstance(value, (int, float)):
+        return 0
+    if isinstance(value, str):
+        return '0' * len(value) if value.isdigit() else 'x' * len(value)
+    return _scrub(value)
+
+
+def _scrub(value):
+    if isinstance(value, dict):
+        return {k: _placeholder(v) if k in scrub_fields else _scrub(v) for k, v in value.items()}
+    if isinstance(value, list):
+        return [_scrub(v) for v in value]
+    return value
+
+
+def _encode_response(body):
+    """去掉响应体中的提督信息后压缩，返回去掉提督信息后的长度和压缩后的响应体。无法解析的响应体原样压缩。
+
+    :param body: bytes
+    :return: tuple
+    """
+    if body.startswith(b'svdata='):
+        try:
+            svdata = _scrub(json.loads(body[7:].decode()))
+            body = b'svdata=' + json.dumps(svdata, separators=(',', ':')).encode()
+        except ValueError:
+            pass
+    return len(body), zlib.compress(body, 1)
+
+
+class CaptureWriter:
+    """kcsapi通信抓取日志的写入类。"""
+
+    def __init__(self, path):
+        """ 构造函数，以O_APPEND方式打开日志文件，新文件会先写入文件头。
+        已有的日志文件末尾如果有不完整或损坏的记录（例如进程在写入时退出），会先截断到最后一条完整的记录。
+
+        :param path: str
+        :return: none
+        """
+        self.fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_APPEND, 0o600)
+        size = os.fstat(self.fd).st_size
+        if size == 0:
+            os.write(self.fd, magic)
+        else:
+            with open(path, 'rb') as f:
+                end = len(magic)
+                for end, record in _scan(f, path):
+                    pass
+            if end < size:
+                os.ftruncate(self.fd, end)
+        self.salt = os.urandom(8)
+        self.pending = set()
+
+    def write(self, started, action, token, data, status, elapsed, body):
+        """ 追加一条记录。`started`为向上游发起请求的时间戳；`data`为客户端提交的表单，其中的api_token会被去掉；
+        `token`只以加盐CRC32的形式保存；请求体和响应体中的提督信息字段会被替换。
+
+        :param started: float
+        :param action: str
+        :param token: str
+        :param data: aiohttp.MultiDictProxy
+        :param status: int
+        :param elapsed: float
+        :param body: bytes
+        :return: none
+        """
+        action = action.encode()
+        session = zlib.crc32(self.salt + (token or '').encode()) & 0xffffffff
+        request_body = urlencode([(k, _placeholder(v) if k in scrub_fields else v)
+                                  for k, v in data.items() if k != 'api_token']).encode()
+        future = asyncio.get_event_loop().run_in_executor(None, _encode_response, body)
+        self.pending.add(future)
+        future.add_done_callback(functools.partial(self._append, started, session, status, elapsed, action,
+                                                   request_body))
+
+    def _append(self, started, session, status, elapsed, action, request_body, future):
+        # 整条记录用一次write写入O_APPEND的文件，多个进程共用同一个日志文件时记录也不会交错
+        self.pending.discard(future)
+        response_size, response_body = future.result()
+        os.write(self.fd, b''.join([header.pack(started, session, status, elapsed, len(action), len(request_body),
+                                                response_size, len(response_body)),
+                                    action, request_body, response_body]))
+
+    @asyncio.coroutine
+    def close(self):
+        """ 等待所有正在压缩的记录写入后关闭日志文件。
+
+        :return: none
+        """
+        if self.pending:
+            yield from asyncio.wait(self.pending)
+        os.close(self.fd)
+
+
+def _scan(f, path):
+    """依次读取`f`中的记录，返回每条记录结束的位置和记录本身。遇到不完整或损坏的记录时停止。
+
+    :param f: file
+    :param path: str
+    :return: generator of tuple
+    """
+    if f.read(len(magic)) != magic:
+        raise ValueError('%s is not an OOI capture file' % path)
+    while True:
+        head = f.read(header.size)
+        if len(head) < header.size:
+            return
+        timestamp, session, status, elapsed, action_len, request_len, response_size, response_len = \
+            header.unpack(head)
+        payload = f.read(action_len + request_len + response_len)
+        if len(payload) < action_len + request_len + response_len:
+            return
+        try:
+            action = payload[:action_len].decode()
+            response_body = zlib.decompress(payload[action_len + request_len:])
+        except (UnicodeDecodeError, zlib.error):
+            return
+        if len(response_body) != response_size:
+            return
+        request_body = payload[action_len:action_len + request_len]
+        yield f.tell(), CaptureRecord(timestamp, session, status, elapsed, action, request_body, response_size,
+                                      response_body)
+
+
+def read_capture(path):
+    """按写入顺序读取日志文件中的所有记录，写入顺序是请求完成的顺序。末尾不完整的记录和损坏的记录及其之后的内容会被忽略。
+
+    :param path: str
+    :return: generator of CaptureRecord
+    """
+    with open(path, 'rb') as f:
+        for end, record in _scan(f, path):
+            yield record
@@ -6,9 +6,26 @@ proxy = os.environ.get('OOI_PROXY', None)
 # Cookie的secret key
 secret_key = os.environ.get('OOI_SECRET_KEY', 'You Must Set A Secret Key!').encode()
 
+# kcsapi通信抓取日志的路径，不设置时不抓取
+capture_file = os.environ.get('OOI_CAPTURE_FILE', None)
+
+# 管理接口的密钥，不设置时管理接口不可用
+admin_key = os.environ.get('OOI_ADMIN_KEY', None)
+
+# 慢请求阈值，单位为毫秒，不设置时不追踪慢请求
+slow_request_threshold = os.environ.get('OOI_SLOW_REQUEST_MS', None)
+if slow_request_threshold is not None:
+    slow_request_threshold = float(slow_request_threshold)
+
+# Jinja2模板字节码缓存目录，不设置时使用Jinja2默认的、只属于当前用户的缓存目录
+template_cache_dir = os.environ.get('OOI_TEMPLATE_CACHE_DIR', None)
+
 # 项目目录
 base_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 template_dir = os.path.join(base_dir, 'templates')
 static_dir = os.path.join(base_dir, 'static')
 kcs_dir = os.path.join(base_dir, '_kcs')
 kcs2_dir = os.path.join(base_dir, '_kcs2')
+
+# 采样分析结果的保存目录，默认为项目目录下只有当前用户可以访问的profiles目录
+profile_dir = os.environ.get('OOI_PROFILE_DIR', os.path.join(base_dir, 'profiles'))
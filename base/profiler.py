@@ -0,0 +1,66 @@
+"""基于SIGPROF的采样分析器。
+按固定的CPU时间间隔中断主线程，记录当前的调用栈，输出flamegraph.pl可以直接使用的折叠栈格式。
+只能在支持setitimer的Unix平台上使用。
+"""
+
+import collections
+import os
+import signal
+
+
+class SamplingProfiler:
+    """采样分析器，同一时间只能运行一个。"""
+
+    def __init__(self):
+        """ 构造函数。
+
+        :return: none
+        """
+        self.samples = collections.Counter()
+        self.handler = signal.SIG_DFL
+        self.running = False
+
+    def _sample(self, signum, frame):
+        stack = []
+        while frame is not None:
+            code = frame.f_code
+            stack.append('%s (%s:%d)' % (code.co_name, os.path.basename(code.co_filename), code.co_firstlineno))
+            frame = frame.f_back
+        self.samples[';'.join(reversed(stack))] += 1
+
+    def start(self, interval=0.01):
+        """ 开始采样，`interval`为采样间隔，单位为秒，按进程消耗的CPU时间计算。
+
+        :param interval: float
+        :return: none
+        """
+        if self.running:
+            raise RuntimeError('Profiler is already running')
+        self.samples.clear()
+        self.handler = signal.signal(signal.SIGPROF, self._sample)
+        try:
+            signal.setitimer(signal.ITIMER_PROF, interval, interval)
+        except (signal.ItimerError, ValueError):
+            signal.signal(signal.SIGPROF, self.handler)
+            raise
+        self.running = True
+
+    def stop(self):
+        """ 停止采样。
+
+        :return: none
+        """
+        signal.setitimer(signal.ITIMER_PROF, 0, 0)
+        signal.signal(signal.SIGPROF, self.handler)
+        self.running = False
+
+    def dump(self, f):
+        """ 把采样结果以折叠栈格式写入文件`f`并关闭它，返回样本总数。
+
+        :param f: file
+        :return: int
+        """
+        with f:
+            for stack, count in self.samples.most_common():
+                f.write('%s %d\n' % (stack, count))
+        return sum(self.samples.values())
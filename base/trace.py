@@ -0,0 +1,100 @@
+"""慢请求追踪。
+记录请求在各个阶段花费的时间，总耗时超过`config.slow_request_threshold`毫秒的请求会写入日志，并保存在`slow_requests`中。
+没有设定阈值时`start_trace`返回不做任何事情的`null_trace`，不会计时。
+"""
+
+import asyncio
+import collections
+import logging
+import time
+
+from base import config
+
+logger = logging.getLogger('ooi.slow')
+
+# 最近的慢请求
+slow_requests = collections.deque(maxlen=100)
+
+
+class RequestTrace:
+    """单个请求的分阶段计时。"""
+
+    def __init__(self, name):
+        """ 构造函数，从此刻开始计时。
+
+        :param name: str
+        :return: none
+        """
+        self.name = name
+        self.start = self.last = time.perf_counter()
+        self.phases = collections.OrderedDict()
+        self.finished = False
+
+    def mark(self, phase):
+        """ 结束阶段`phase`，从上一次标记到现在的时间都计入该阶段。
+
+        :param phase: str
+        :return: none
+        """
+        now = time.perf_counter()
+        self.phases[phase] = self.phases.get(phase, 0) + now - self.last
+        self.last = now
+
+    def finish(self):
+        """ 结束计时，总耗时超过阈值时记录该请求。
+
+        :return: none
+        """
+        self.finished = True
+        total = (self.last - self.start) * 1000
+        if total < config.slow_request_threshold:
+            return
+        phases = collections.OrderedDict((phase, elapsed * 1000) for phase, elapsed in self.phases.items())
+        slow_requests.append({'name': self.name,
+                              'time': time.time(),
+                              'total_ms': total,
+                              'phases_ms': phases})
+        logger.warning('Slow request %s %.1f ms: %s', self.name, total,
+                       ', '.join('%s %.1f ms' % item for item in phases.items()))
+
+    def attach(self, response):
+        """ 让`response`写完之后标记response_write阶段并结束计时，返回`response`本身。
+        响应由aiohttp在处理函数返回后写出，因此response_write也包含了会话中间件保存会话的时间。
+
+        :param response: aiohttp.web.StreamResponse
+        :return: aiohttp.web.StreamResponse
+        """
+        write_eof = response.write_eof
+
+        @asyncio.coroutine
+        def traced_write_eof():
+            yield from write_eof()
+            if not self.finished:
+                self.mark('response_write')
+                self.finish()
+
+        response.write_eof = traced_write_eof
+        return response
+
+
+class NullTrace:
+    """没有设定慢请求阈值时使用的空追踪，所有方法都不做任何事情。"""
+
+    def mark(self, phase):
+        pass
+
+    def attach(self, response):
+        return response
+
+null_trace = NullTrace()
+
+
+def start_trace(name):
+    """开始追踪请求`name`，没有设定慢请求阈值时返回`null_trace`。
+
+    :param name: str
+    :return: RequestTrace or NullTrace
+    """
+    if config.slow_request_threshold is None:
+        return null_trace
+    return RequestTrace(name)
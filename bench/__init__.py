@@ -0,0 +1,3 @@
+"""OOI3的性能测试工具。
+包含模拟DMM和游戏服务器的本地上游服务器、连接到本地上游的OOI服务器以及并发负载生成器。
+"""
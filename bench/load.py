@@ -0,0 +1,153 @@
+"""并发负载生成器。
+每个场景启动`concurrency`个虚拟用户，每个虚拟用户拥有自己的aiohttp会话，循环发起请求直到总请求数达到`requests`。
+"""
+
+import asyncio
+import math
+import time
+
+import aiohttp
+
+# 伪装成Win7 x64上的IE11
+user_agent = 'Mozilla/5.0 (Windows NT 6.1; WOW64; Trident/7.0; rv:11.0) like Gecko'
+
+
+def percentile(values, p):
+    """计算已排序列表`values`的第`p`百分位数（最近秩法）。
+
+    :param values: list
+    :param p: float
+    :return: float or None
+    """
+    if not values:
+        return None
+    rank = max(math.ceil(p / 100 * len(values)), 1)
+    return values[rank - 1]
+
+
+def memory_usage(pid):
+    """读取进程`pid`当前和峰值的常驻内存，单位为KB。只支持Linux，其他平台返回None。
+
+    :param pid: int
+    :return: dict or None
+    """
+    try:
+        with open('/proc/%d/status' % pid) as f:
+            lines = f.readlines()
+    except OSError:
+        return None
+    usage = {}
+    for line in lines:
+        if line.startswith('VmRSS:'):
+            usage['rss_kb'] = int(line.split()[1])
+        elif line.startswith('VmHWM:'):
+            usage['peak_rss_kb'] = int(line.split()[1])
+    return usage
+
+
+class LoadGenerator:
+    """针对OOI服务器的负载生成类。"""
+
+    def __init__(self, base_url, loop):
+        """ 构造函数。
+
+        :param base_url: str
+        :param loop: asyncio.AbstractEventLoop
+        :return: none
+        """
+        self.base_url = base_url.rstrip('/')
+        self.loop = loop
+        self.scenarios = {'login': (self._no_setup, self.login),
+                          'api': (self._login_setup, self.api),
+                          'world_image': (self._login_setup, self.world_image),
+                          'static': (self._no_setup, self.static)}
+
+    @asyncio.coroutine
+    def _no_setup(self, session):
+        return None
+
+    @asyncio.coroutine
+    def _login_setup(self, session):
+        """以浏览器模式登录，使会话中带有api_token、api_starttime和world_ip。"""
+        ok = yield from self.login(session)
+        if not ok:
+            raise RuntimeError('Login failed while preparing the session')
+
+    @asyncio.coroutine
+    def _fetch(self, session, method, path, expected_status, **kwargs):
+        response = yield from session.request(method, self.base_url + path, **kwargs)
+        yield from response.read()
+        return response.status == expected_status
+
+    @asyncio.coroutine
+    def login(self, session):
+        """提交登录表单，期望跳转到游戏页面。"""
+        data = {'login_id': 'bench@example.com', 'password': 'bench', 'mode': '1'}
+        return (yield from self._fetch(session, 'POST', '/', 302, data=data, allow_redirects=False))
+
+    @asyncio.coroutine
+    def api(self, session):
+        """通过OOI转发一个/kcsapi请求。"""
+        data = {'api_token': 'mockapitoken', 'api_verno': '1'}
+        headers = {'User-Agent': user_agent,
+                   'Referer': self.base_url + '/kcs2/index.php'}
+        return (yield from self._fetch(session, 'POST', '/kcsapi/api_port/port', 200, data=data, headers=headers))
+
+    @asyncio.coroutine
+    def world_image(self, session):
+        """请求镇守府图片。"""
+        return (yield from self._fetch(session, 'GET', '/kcs/resources/image/world/127_000_000_001_l.png', 200))
+
+    @asyncio.coroutine
+    def static(self, session):
+        """请求静态文件。"""
+        return (yield from self._fetch(session, 'GET', '/static/css/ooi.css', 200))
+
+    @asyncio.coroutine
+    def run(self, name, concurrency, requests):
+        """运行场景`name`，返回吞吐量和延迟统计。
+
+        :param name: str
+        :param concurrency: int
+        :param requests: int
+        :return: dict
+        """
+        setup, request = self.scenarios[name]
+        latencies = []
+        errors = [0]
+        remaining = [requests]
+
+        @asyncio.coroutine
+        def worker(session):
+            while remaining[0] > 0:
+                remaining[0] -= 1
+                start = time.perf_counter()
+                try:
+                    ok = yield from request(session)
+                except (aiohttp.ClientError, asyncio.TimeoutError, OSError):
+                    ok = False
+                if ok:
+                    latencies.append(time.perf_counter() - start)
+                else:
+                    errors[0] += 1
+
+        sessions = [aiohttp.ClientSession(loop=self.loop) for _ in range(concurrency)]
+        try:
+            yield from asyncio.gather(*[setup(session) for session in sessions], loop=self.loop)
+            start = time.perf_counter()
+            yield from asyncio.gather(*[worker(session) for session in sessions], loop=self.loop)
+            elapsed = time.perf_counter() - start
+        finally:
+            for session in sessions:
+                session.close()
+
+        latencies.sort()
+        return {'requests': requests,
+                'concurrency': concurrency,
+                'errors': errors[0],
+                'elapsed_s': elapsed,
+                'throughput_rps': len(latencies) / elapsed if elapsed else None,
+                'latency_ms': {'mean': sum(latencies) / len(latencies) * 1000 if latencies else None,
+                               'p50': percentile(latencies, 50) * 1000 if latencies else None,
+                               'p99': percentile(latencies, 99) * 1000 if latencies else None,
+                               'max': latencies[-1] * 1000 if latencies else None}}
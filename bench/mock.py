@@ -0,0 +1,185 @@
+"""模拟DMM登录页面、osapi.dmm.com的makeRequest、api_world/get_id以及游戏服务器/kcsapi的本地上游服务器。
+所有上游地址都由同一个aiohttp应用提供，按路径区分，可以配置响应延迟和响应体大小。
+指定抓取日志时，/kcsapi按action依次返回日志中记录的响应体。
+"""
+
+import argparse
+import asyncio
+import itertools
+import json
+
+import aiohttp
+import aiohttp.web
+
+from base.capture import read_capture
+
+parser = argparse.ArgumentParser(description='OOI3 mock upstream server')
+parser.add_argument('-H', '--host', default='127.0.0.1',
+                    help='The host of mock upstream server')
+parser.add_argument('-p', '--port', type=int, default=9998,
+                    help='The port of mock upstream server')
+parser.add_argument('--latency', type=float, default=0.0,
+                    help='Delay before every upstream response, in milliseconds')
+parser.add_argument('--payload-size', type=int, default=4096,
+                    help='Body size of /kcsapi and world image responses, in bytes')
+parser.add_argument('--capture', default=None,
+                    help='Serve /kcsapi response bodies recorded in this capture file')
+
+
+class MockUpstream:
+    """模拟上游服务器的请求处理类。"""
+
+    # makeRequest响应的前缀，KancolleAuth会跳过前27个字符
+    make_request_prefix = "throw 1; < don't be evil' >"
+
+    def __init__(self, host, port, latency=0.0, payload_size=4096, capture=None):
+        """ 构造函数，预先生成所有响应体。
+        `latency`为每个响应之前的延迟，单位为毫秒；`payload_size`为/kcsapi和镇守府图片响应体的大小，单位为字节；
+        `capture`为抓取日志的路径，日志中出现过的action使用记录的响应体，其他action使用固定大小的响应体。
+
+        :param host: str
+        :param port: int
+        :param latency: float
+        :param payload_size: int
+        :param capture: str
+        :return: none
+        """
+        self.address = '%s:%d' % (host, port)
+        self.latency = latency / 1000
+        self.payload_size = payload_size
+
+        svdata = {'api_result': 1, 'api_result_msg': '成功', 'api_data': {'api_padding': ''}}
+        overhead = len(('svdata=' + json.dumps(svdata)).encode())
+        svdata['api_data']['api_padding'] = 'x' * max(payload_size - overhead, 0)
+        self.api_body = ('svdata=' + json.dumps(svdata)).encode()
+        self.image_body = b'\x89PNG\r\n\x1a\n' + b'\x00' * max(payload_size - 8, 0)
+
+        self.responses = {}
+        if capture:
+            recorded = {}
+            for record in read_capture(capture):
+                if record.status == 200:
+                    recorded.setdefault(record.action, []).append(record.response_body)
+            self.responses = {action: itertools.cycle(bodies) for action, bodies in recorded.items()}
+
+    def add_routes(self, app):
+        """ 给应用添加所有模拟上游的路由。
+
+        :param app: aiohttp.web.Application
+        :return: none
+        """
+        app.router.add_route('GET', '/service/login/password/=/', self.login)
+        app.router.add_route('POST', '/service/api/get-token/', self.ajax)
+        app.router.add_route('POST', '/service/login/password/authenticate/', self.auth)
+        app.router.add_route('GET', '/netgame/social/-/gadgets/=/app_id=854854/', self.game)
+        app.router.add_route('POST', '/gadgets/makeRequest', self.make_request)
+        app.router.add_route('GET', '/kcsapi/api_world/get_id/{owner}/1/{t}', self.get_world)
+        app.router.add_route('POST', '/kcsapi/{action:.+}', self.api)
+        app.router.add_route('GET', '/kcs/resources/image/world/{name}.png', self.world_image)
+
+    @asyncio.coroutine
+    def _delay(self):
+        if self.latency > 0:
+            yield from asyncio.sleep(self.latency)
+
+    def _html(self, html):
+        return aiohttp.web.Response(body=html.encode(),
+                                    headers=aiohttp.MultiDict({'Content-Type': 'text/html; charset=utf-8'}))
+
+    @asyncio.coroutine
+    def login(self, request):
+        """DMM登录页面，包含token和dmm_token。"""
+        yield from self._delay()
+        return self._html('<meta name="csrf-token" content="mocktoken">\n'
+                          '<meta name="csrf-http-dmm-token" content="mockdmmtoken">\n')
+
+    @asyncio.coroutine
+    def ajax(self, request):
+        """DMM登录页面的AJAX请求，返回第二个token以及idKey和pwdKey。"""
+        yield from request.post()
+        yield from self._delay()
+        body = {'body': {'token': 'mockajaxtoken', 'login_id': 'mockidkey', 'password': 'mockpwdkey'}}
+        return aiohttp.web.Response(body=json.dumps(body).encode(),
+                                    headers=aiohttp.MultiDict({'Content-Type': 'application/json'}))
+
+    @asyncio.coroutine
+    def auth(self, request):
+        """DMM认证页面，总是认证成功。"""
+        yield from request.post()
+        yield from self._delay()
+        return self._html('<html></html>')
+
+    @asyncio.coroutine
+    def game(self, request):
+        """游戏页面，包含内嵌游戏网页的地址。"""
+        yield from self._delay()
+        osapi_url = 'http://%s/gadgets/ifr?synd=dmm&owner=10000001&st=mockst' % self.address
+        return self._html('var gadgetInfo = {\n    URL : "%s",\n};\n' % osapi_url)
+
+    @asyncio.coroutine
+    def make_request(self, request):
+        """osapi.dmm.com的makeRequest，返回api_token和api_starttime。"""
+        data = yield from request.post()
+        yield from self._delay()
+        svdata = {'api_result': 1, 'api_token': 'mockapitoken', 'api_starttime': 1450000000000}
+        body = {data.get('url'): {'rc': 200, 'body': 'svdata=' + json.dumps(svdata)}}
+        return aiohttp.web.Response(body=(self.make_request_prefix + json.dumps(body)).encode(),
+                                    headers=aiohttp.MultiDict({'Content-Type': 'text/plain'}))
+
+    @asyncio.coroutine
+    def get_world(self, request):
+        """api_world/get_id，总是返回第一个镇守府。"""
+        yield from self._delay()
+        svdata = {'api_result': 1, 'api_data': {'api_world_id': 1}}
+        return aiohttp.web.Response(body=('svdata=' + json.dumps(svdata)).encode(),
+                                    headers=aiohttp.MultiDict({'Content-Type': 'text/plain'}))
+
+    @asyncio.coroutine
+    def api(self, request):
+        """游戏服务器的/kcsapi，返回抓取日志中记录的响应体或固定大小的响应体。"""
+        action = request.match_info['action']
+        yield from request.post()
+        yield from self._delay()
+        if action in self.responses:
+            body = next(self.responses[action])
+        else:
+            body = self.api_body
+        return aiohttp.web.Response(body=body,
+                                    headers=aiohttp.MultiDict({'Content-Type': 'text/plain'}))
+
+    @asyncio.coroutine
+    def world_image(self, request):
+        """镇守府图片，返回固定大小的响应体。"""
+        yield from self._delay()
+        return aiohttp.web.Response(body=self.image_body,
+                                    headers=aiohttp.MultiDict({'Content-Type': 'image/png'}))
+
+
+def main():
+    """模拟上游服务器运行主函数。
+
+    :return: none
+    """
+    args = parser.parse_args()
+    loop = asyncio.get_event_loop()
+
+    upstream = MockUpstream(args.host, args.port, latency=args.latency, payload_size=args.payload_size,
+                            capture=args.capture)
+    app = aiohttp.web.Application(loop=loop)
+    upstream.add_routes(app)
+    app_handlers = app.make_handler()
+
+    server = loop.run_until_complete(loop.create_server(app_handlers, args.host, args.port))
+    print('Mock upstream serving on http://%s:%d' % server.sockets[0].getsockname())
+    try:
+        loop.run_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        loop.run_until_complete(app_handlers.finish_connections(1.0))
+        server.close()
+        loop.run_until_complete(server.wait_closed())
+    loop.close()
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,156 @@
+"""回放kcsapi抓取日志。
+启动返回日志中记录的响应体的模拟上游服务器和连接到它的OOI服务器，日志中的每个会话对应一个虚拟用户，登录后按记录的时间间隔
+（除以`--speed`）依次发起API请求，把每个action的延迟统计和相对计划时间的滞后写入JSON文件。
+
+用法：python -m bench.replay capture.bin --speed 4 --output replay.json
+"""
+
+import argparse
+import asyncio
+import json
+import platform
+import time
+from urllib.parse import parse_qsl, urlencode
+
+import aiohttp
+
+from base.capture import read_capture
+from bench.load import LoadGenerator, memory_usage, percentile, user_agent
+from bench.run import start_servers, stop_process
+
+parser = argparse.ArgumentParser(description='Replay a kcsapi capture against OOI3')
+parser.add_argument('capture',
+                    help='The capture file written with OOI_CAPTURE_FILE')
+parser.add_argument('--speed', type=float, default=1.0,
+                    help='Replay speed multiplier, 0 to replay as fast as possible')
+parser.add_argument('--latency', type=float, default=0.0,
+                    help='Delay before every upstream response, in milliseconds')
+parser.add_argument('-o', '--output', default='replay-result.json',
+                    help='The JSON file to write results to')
+
+
+def summarize(latencies):
+    """统计延迟列表，单位转换为毫秒。
+
+    :param latencies: list
+    :return: dict
+    """
+    latencies = sorted(latencies)
+    if not latencies:
+        return {'count': 0, 'mean': None, 'p50': None, 'p99': None, 'max': None}
+    return {'count': len(latencies),
+            'mean': sum(latencies) / len(latencies) * 1000,
+            'p50': percentile(latencies, 50) * 1000,
+            'p99': percentile(latencies, 99) * 1000,
+            'max': latencies[-1] * 1000}
+
+
+@asyncio.coroutine
+def replay(base_url, records, speed, loop):
+    """按会话回放`records`，返回每个action的延迟、滞后和错误数。
+
+    :param base_url: str
+    :param records: list of CaptureRecord
+    :param speed: float
+    :param loop: asyncio.AbstractEventLoop
+    :return: dict
+    """
+    # 日志按请求完成的顺序写入，回放按发起请求的时间排序
+    records = sorted(records, key=lambda record: record.timestamp)
+    sessions = {}
+    for record in records:
+        sessions.setdefault(record.session, []).append(record)
+    origin = records[0].timestamp
+    generator = LoadGenerator(base_url, loop)
+    latencies = {}
+    lags = []
+    errors = [0]
+    headers = {'User-Agent': user_agent,
+               'Referer': base_url + '/kcs2/index.php',
+               'Content-Type': 'application/x-www-form-urlencoded'}
+
+    @asyncio.coroutine
+    def player(session, session_records, start):
+        for record in session_records:
+            if speed > 0:
+                scheduled = start + (record.timestamp - origin) / speed
+                delay = scheduled - time.perf_counter()
+                if delay > 0:
+                    yield from asyncio.sleep(delay)
+                lags.append(max(time.perf_counter() - scheduled, 0))
+            data = parse_qsl(record.request_body.decode(), keep_blank_values=True) + [('api_token', 'mockapitoken')]
+            begin = time.perf_counter()
+            try:
+                response = yield from session.post(base_url + '/kcsapi/' + record.action,
+                                                   data=urlencode(data).encode(), headers=headers)
+                yield from response.read()
+                ok = response.status == 200
+            except (aiohttp.ClientError, asyncio.TimeoutError, OSError):
+                ok = False
+            if ok:
+                latencies.setdefault(record.action, []).append(time.perf_counter() - begin)
+            else:
+                errors[0] += 1
+
+    clients = {tag: aiohttp.ClientSession(loop=loop) for tag in sessions}
+    try:
+        yield from asyncio.gather(*[generator.login(client) for client in clients.values()], loop=loop)
+        start = time.perf_counter()
+        yield from asyncio.gather(*[player(clients[tag], session_records, start)
+                                    for tag, session_records in sessions.items()], loop=loop)
+        elapsed = time.perf_counter() - start
+    finally:
+        for client in clients.values():
+            client.close()
+
+    everything = [latency for values in latencies.values() for latency in values]
+    return {'sessions': len(sessions),
+            'requests': len(records),
+            'errors': errors[0],
+            'elapsed_s': elapsed,
+            'throughput_rps': len(everything) / elapsed if elapsed else None,
+            'latency_ms': summarize(everything),
+            'lag_ms': summarize(lags),
+            'actions': {action: summarize(values) for action, values in latencies.items()}}
+
+
+def main():
+    """回放工具运行主函数。
+
+    :return: none
+    """
+    args = parser.parse_args()
+    records = list(read_capture(args.capture))
+    if not records:
+        parser.error('%s contains no records' % args.capture)
+    loop = asyncio.get_event_loop()
+
+    upstream, server, base_url = start_servers(args.latency, 0, capture=args.capture)
+    try:
+        memory_before = memory_usage(server.pid)
+        result = loop.run_until_complete(replay(base_url, records, args.speed, loop))
+        result['memory_before'] = memory_before
+        result['memory_after'] = memory_usage(server.pid)
+    finally:
+        stop_process(server)
+        stop_process(upstream)
+        loop.close()
+
+    latency = result['latency_ms']
+    print('%d requests from %d sessions  %.1f req/s  p50 %.2f ms  p99 %.2f ms  errors %d' %
+          (result['requests'], result['sessions'], result['throughput_rps'] or 0,
+           latency['p50'] or 0, latency['p99'] or 0, result['errors']))
+
+    report = {'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+              'python': platform.python_version(),
+              'platform': platform.platform(),
+              'config': {'capture': args.capture,
+                         'speed': args.speed,
+                         'latency_ms': args.latency},
+              'result': result}
+    with open(args.output, 'w') as f:
+        json.dump(report, f, indent=2, sort_keys=True)
+    print('Results written to %s' % args.output)
+
+if __name__ == '__main__':
+    main()
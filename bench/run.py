@@ -0,0 +1,159 @@
+"""OOI3性能测试的运行入口。
+启动模拟上游服务器和连接到它的OOI服务器，依次运行各个负载场景，把吞吐量、p50/p99延迟和OOI进程内存写入JSON文件，方便比较不同版本。
+
+用法：python -m bench.run --latency 20 --payload-size 65536 --concurrency 50 --requests 5000 --output result.json
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import platform
+import signal
+import socket
+import subprocess
+import sys
+import time
+
+from base import config
+from bench.load import LoadGenerator, memory_usage
+
+parser = argparse.ArgumentParser(description='OOI3 load-test benchmark suite')
+parser.add_argument('-s', '--scenarios', nargs='+', default=['login', 'api', 'world_image', 'static'],
+                    choices=['login', 'api', 'world_image', 'static'],
+                    help='The scenarios to run')
+parser.add_argument('-c', '--concurrency', type=int, default=50,
+                    help='Number of concurrent virtual users')
+parser.add_argument('-n', '--requests', type=int, default=2000,
+                    help='Number of requests per scenario')
+parser.add_argument('--latency', type=float, default=0.0,
+                    help='Delay before every upstream response, in milliseconds')
+parser.add_argument('--payload-size', type=int, default=4096,
+                    help='Body size of /kcsapi and world image responses, in bytes')
+parser.add_argument('-o', '--output', default='bench-result.json',
+                    help='The JSON file to write results to')
+
+# 运行性能测试时使用的Cookie secret key，EncryptedCookieStorage要求32字节
+bench_secret_key = 'OOI3 benchmark secret key 32byte'
+
+
+def free_port():
+    """获取一个空闲的本地TCP端口。
+
+    :return: int
+    """
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def wait_for_port(port, timeout=10):
+    """等待本地端口`port`可以连接，超时后抛出RuntimeError。
+
+    :param port: int
+    :param timeout: int
+    :return: none
+    """
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            socket.create_connection(('127.0.0.1', port), timeout=1).close()
+            return
+        except OSError:
+            time.sleep(0.1)
+    raise RuntimeError('Port %d is not ready after %d seconds' % (port, timeout))
+
+
+def start_process(module, *args):
+    """在子进程中运行bench中的模块`module`，工作目录为项目目录。
+
+    :param module: str
+    :param args: str
+    :return: subprocess.Popen
+    """
+    env = dict(os.environ, OOI_SECRET_KEY=bench_secret_key)
+    env.pop('OOI_PROXY', None)
+    return subprocess.Popen([sys.executable, '-m', module] + list(args), cwd=config.base_dir, env=env)
+
+
+def stop_process(process):
+    """用SIGINT停止子进程，使其正常执行清理工作。
+
+    :param process: subprocess.Popen
+    :return: none
+    """
+    process.send_signal(signal.SIGINT)
+    try:
+        process.wait(timeout=10)
+    except subprocess.TimeoutExpired:
+        process.kill()
+        process.wait()
+
+
+def start_servers(latency, payload_size, capture=None):
+    """启动模拟上游服务器和连接到它的OOI服务器，返回两个子进程和OOI服务器的地址。
+    指定`capture`时，模拟上游服务器返回抓取日志中记录的响应体。
+
+    :param latency: float
+    :param payload_size: int
+    :param capture: str
+    :return: tuple
+    """
+    upstream_port = free_port()
+    ooi_port = free_port()
+    mock_args = ['--port', str(upstream_port), '--latency', str(latency), '--payload-size', str(payload_size)]
+    if capture:
+        mock_args += ['--capture', os.path.abspath(capture)]
+    upstream = start_process('bench.mock', *mock_args)
+    server = start_process('bench.server', '--port', str(ooi_port),
+                           '--upstream', '127.0.0.1:%d' % upstream_port)
+    try:
+        wait_for_port(upstream_port)
+        wait_for_port(ooi_port)
+    except RuntimeError:
+        stop_process(server)
+        stop_process(upstream)
+        raise
+    return upstream, server, 'http://127.0.0.1:%d' % ooi_port
+
+
+def main():
+    """性能测试运行主函数。
+
+    :return: none
+    """
+    args = parser.parse_args()
+    loop = asyncio.get_event_loop()
+
+    upstream, server, base_url = start_servers(args.latency, args.payload_size)
+    results = {}
+    try:
+        generator = LoadGenerator(base_url, loop)
+        for name in args.scenarios:
+            memory_before = memory_usage(server.pid)
+            result = loop.run_until_complete(generator.run(name, args.concurrency, args.requests))
+            result['memory_before'] = memory_before
+            result['memory_after'] = memory_usage(server.pid)
+            results[name] = result
+            latency = result['latency_ms']
+            print('%-12s %10.1f req/s  p50 %8.2f ms  p99 %8.2f ms  errors %d' %
+                  (name, result['throughput_rps'] or 0, latency['p50'] or 0, latency['p99'] or 0, result['errors']))
+    finally:
+        stop_process(server)
+        stop_process(upstream)
+        loop.close()
+
+    report = {'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+              'python': platform.python_version(),
+              'platform': platform.platform(),
+              'config': {'concurrency': args.concurrency,
+                         'requests': args.requests,
+                         'latency_ms': args.latency,
+                         'payload_size': args.payload_size},
+              'results': results}
+    with open(args.output, 'w') as f:
+        json.dump(report, f, indent=2, sort_keys=True)
+    print('Results written to %s' % args.output)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,52 @@
+"""连接到本地模拟上游服务器的OOI服务器。
+把KancolleAuth和APIHandler中所有上游地址替换成模拟上游服务器的地址后，按正常方式运行OOI。
+"""
+
+import argparse
+import asyncio
+
+import ooi
+from auth.kancolle import KancolleAuth
+from handlers.api import APIHandler
+
+parser = argparse.ArgumentParser(description='OOI3 server connected to a mock upstream')
+parser.add_argument('-H', '--host', default='127.0.0.1',
+                    help='The host of OOI server')
+parser.add_argument('-p', '--port', type=int, default=9999,
+                    help='The port of OOI server')
+parser.add_argument('-u', '--upstream', default='127.0.0.1:9998',
+                    help='The host:port of mock upstream server')
+
+
+def use_upstream(upstream):
+    """把OOI的所有上游地址替换成`upstream`，`upstream`的格式为host:port。
+
+    :param upstream: str
+    :return: none
+    """
+    KancolleAuth.urls = dict(KancolleAuth.urls,
+                             login='http://%s/service/login/password/=/' % upstream,
+                             ajax='http://%s/service/api/get-token/' % upstream,
+                             auth='http://%s/service/login/password/authenticate/' % upstream,
+                             game='http://%s/netgame/social/-/gadgets/=/app_id=854854/' % upstream,
+                             make_request='http://%s/gadgets/makeRequest' % upstream,
+                             get_world='http://' + upstream + '/kcsapi/api_world/get_id/%s/1/%d')
+    KancolleAuth.world_ip_list = (upstream, )
+    APIHandler.urls = dict(APIHandler.urls,
+                           world_image='http://' + upstream + '/kcs/resources/image/world/%s.png')
+
+
+def main():
+    """连接到模拟上游的OOI服务器运行主函数。
+
+    :return: none
+    """
+    args = parser.parse_args()
+    use_upstream(args.upstream)
+
+    loop = asyncio.get_event_loop()
+    app = ooi.make_app(loop)
+    ooi.serve(app, loop, args.host, args.port)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,117 @@
+"""OOI3的管理接口。
+所有请求都需要在`X-OOI-Admin-Key`请求头或`key`参数中提供环境变量`OOI_ADMIN_KEY`设定的密钥，没有设定密钥时管理接口不可用。
+"""
+
+import asyncio
+import aiohttp
+import aiohttp.web
+import hmac
+import json
+import logging
+import os
+import time
+
+from base import config
+from base.profiler import SamplingProfiler
+from base.trace import slow_requests
+
+logger = logging.getLogger('ooi.profile')
+
+
+class AdminHandler:
+    """OOI3管理接口请求处理类。"""
+
+    # 单次采样分析的最长时间，单位为秒；采样间隔必须在1到1000毫秒之间
+    max_profile_seconds = 300
+
+    def __init__(self):
+        """ 构造函数，初始化采样分析器。
+
+        :return: none
+        """
+        self.profiler = SamplingProfiler()
+
+    @asyncio.coroutine
+    def _check_key(self, request):
+        """检查请求中的管理密钥，返回提交的表单。没有设定密钥时返回404，密钥错误时返回403。
+
+        :param request: aiohttp.web.Request
+        :return: aiohttp.MultiDictProxy
+        """
+        if not config.admin_key:
+            raise aiohttp.web.HTTPNotFound()
+        data = yield from request.post()
+        key = request.headers.get('X-OOI-Admin-Key') or data.get('key') or request.GET.get('key') or ''
+        if not hmac.compare_digest(key.encode(), config.admin_key.encode()):
+            raise aiohttp.web.HTTPForbidden()
+        return data
+
+    def _json(self, result):
+        headers = aiohttp.MultiDict({'Content-Type': 'application/json'})
+        return aiohttp.web.Response(body=json.dumps(result).encode(), headers=headers)
+
+    def _open_profile(self):
+        """在`config.profile_dir`中以独占方式创建结果文件，目录不存在时以0700权限创建，不跟随符号链接。
+
+        :return: tuple
+        """
+        os.makedirs(config.profile_dir, mode=0o700, exist_ok=True)
+        now = time.time()
+        name = 'ooi-profile-%s-%03d-%d.folded' % (time.strftime('%Y%m%d-%H%M%S', time.localtime(now)),
+                                                  int(now * 1000) % 1000, os.getpid())
+        path = os.path.join(config.profile_dir, name)
+        fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_EXCL | os.O_NOFOLLOW, 0o600)
+        return path, os.fdopen(fd, 'w')
+
+    def _stop_profile(self, path, f):
+        self.profiler.stop()
+        count = self.profiler.dump(f)
+        logger.warning('Profile with %d samples written to %s', count, path)
+
+    @asyncio.coroutine
+    def profile(self, request):
+        """开始一次采样分析，`seconds`秒后停止并把折叠栈写入`config.profile_dir`中的文件，返回一个JSON格式的字典。
+        结果文件在开始采样前创建，无法创建时不会开始采样。
+        `seconds`必须大于0且不超过`max_profile_seconds`，采样间隔`interval`以毫秒为单位，必须在1到1000之间，否则返回400错误。
+        结果中`status`键值为1时开始成功，`output`键值为结果文件的路径；`status`为0时开始失败，`message`键值提供了错误信息。
+
+        :param request: aiohttp.web.Request
+        :return: aiohttp.web.Response
+        """
+        data = yield from self._check_key(request)
+        try:
+            seconds = float(data.get('seconds', 30))
+            interval = float(data.get('interval', 10))
+        except ValueError:
+            raise aiohttp.web.HTTPBadRequest()
+        if not 0 < seconds <= self.max_profile_seconds or not 1 <= interval <= 1000:
+            raise aiohttp.web.HTTPBadRequest()
+
+        if self.profiler.running:
+            return self._json({'status': 0,
+                               'message': 'Profiler is already running'})
+
+        try:
+            path, f = self._open_profile()
+        except OSError as e:
+            return self._json({'status': 0,
+                               'message': 'Cannot create profile output: %s' % e})
+        try:
+            self.profiler.start(interval / 1000)
+        except Exception:
+            f.close()
+            raise
+        request.app.loop.call_later(seconds, self._stop_profile, path, f)
+        return self._json({'status': 1,
+                           'seconds': seconds,
+                           'output': path})
+
+    @asyncio.coroutine
+    def slow(self, request):
+        """返回最近记录的慢请求及其各阶段耗时，返回一个JSON格式的列表。
+
+        :param request: aiohttp.web.Request
+        :return: aiohttp.web.Response
+        """
+        yield from self._check_key(request)
+        return self._json(list(slow_requests))
@@ -5,14 +5,21 @@
 import aiohttp
 import aiohttp.web
 import asyncio
+import time
 from aiohttp_session import get_session
 
 from base import config
+from base.capture import CaptureWriter
+from base.trace import start_trace
 
 
 class APIHandler:
     """ OOI3中用于转发客户端FLASH和游戏服务器间通信的类。"""
 
+    # 转发过程中需要的URLs
+    urls = {'world_image': 'http://203.104.209.102/kcs/resources/image/world/%s.png',
+            'api': 'http://%s/kcsapi/%s'}
+
     def __init__(self):
         """ 构造函数，根据环境变量初始化代理服务器。
 
@@ -27,6 +34,22 @@ class APIHandler:
         self.api_start2 = None
         self.worlds = {}
 
+        # 设定了抓取日志路径时，记录转发的每个API请求
+        if config.capture_file:
+            self.capture = CaptureWriter(config.capture_file)
+        else:
+            self.capture = None
+
+    @asyncio.coroutine
+    def close(self, app):
+        """ 应用关闭时调用，关闭抓取日志。
+
+        :param app: aiohttp.web.Application
+        :return: none
+        """
+        if self.capture:
+            yield from self.capture.close()
+
     @asyncio.coroutine
     def world_image(self, request):
         """ 显示正确的镇守府图片。
@@ -39,12 +62,12 @@ class APIHandler:
         session = yield from get_session(request)
         world_ip = session['world_ip']
         if world_ip:
-            ip_sections = map(int, world_ip.split('.'))
+            ip_sections = map(int, world_ip.split(':')[0].split('.'))
             image_name = '_'.join([format(x, '03') for x in ip_sections]) + '_' + size
             if image_name in self.worlds:
                 body = self.worlds[image_name]
             else:
-                url = 'http://203.104.209.102/kcs/resources/image/world/' + image_name + '.png'
+                url = self.urls['world_image'] % image_name
                 coro = aiohttp.get(url, connector=self.connector)
                 try:
                     response = yield from asyncio.wait_for(coro, timeout=5)
@@ -59,36 +82,51 @@ class APIHandler:
     @asyncio.coroutine
     def api(self, request):
         """ 转发客户端和游戏服务器之间的API通信。
+        设定了慢请求阈值时，记录各阶段的耗时：session_decode（会话解码）、body_parse（请求体解析）、upstream_headers（连接上游直到
+        收到响应头，包含上游服务器的处理时间）、upstream_body（读取上游响应体）和response_write（写出响应）。
 
         :param request: aiohttp.web.Request
         :return: aiohttp.web.Response or aiohttp.web.HTTPBadRequest
         """
         action = request.match_info['action']
+        trace = start_trace('api ' + action)
         session = yield from get_session(request)
+        trace.mark('session_decode')
         world_ip = session['world_ip']
         if world_ip:
             if action == 'api_start2' and self.api_start2 is not None:
-                return aiohttp.web.Response(body=self.api_start2,
-                                            headers=aiohttp.MultiDict({'Content-Type': 'text/plain'}))
+                return trace.attach(aiohttp.web.Response(body=self.api_start2,
+                                                         headers=aiohttp.MultiDict({'Content-Type': 'text/plain'})))
             else:
                 referrer = request.headers.get('REFERER')
                 referrer = referrer.replace(request.host, world_ip)
                 referrer = referrer.replace('https://', 'http://')
-                url = 'http://' + world_ip + '/kcsapi/' + action
+                url = self.urls['api'] % (world_ip, action)
                 headers = aiohttp.MultiDict({
                     'User-Agent': 'Mozilla/5.0 (Windows NT 6.1; WOW64; Trident/7.0; rv:11.0) like Gecko',
                     'Origin': 'http://' + world_ip + '/',
                     'Referer': referrer,
                 })
                 data = yield from request.post()
+                trace.mark('body_parse')
+                start = time.time()
                 coro = aiohttp.post(url, data=data, headers=headers, connector=self.connector)
                 try:
                     response = yield from asyncio.wait_for(coro, timeout=5)
                 except asyncio.TimeoutError:
-                    return aiohttp.web.HTTPBadRequest()
+                    trace.mark('upstream_headers')
+                    if self.capture:
+                        self.capture.write(start, action, session.get('api_token'), data, 0, time.time() - start, b'')
+                    return trace.attach(aiohttp.web.HTTPBadRequest())
+                trace.mark('upstream_headers')
                 body = yield from response.read()
+                trace.mark('upstream_body')
+                if self.capture:
+                    self.capture.write(start, action, session.get('api_token'), data, response.status,
+                                       time.time() - start, body)
                 if action == 'api_start2' and len(body) > 100000:
                     self.api_start2 = body
-                return aiohttp.web.Response(body=body, headers=aiohttp.MultiDict({'Content-Type': 'text/plain'}))
+                return trace.attach(aiohttp.web.Response(body=body,
+                                                         headers=aiohttp.MultiDict({'Content-Type': 'text/plain'})))
         else:
             return aiohttp.web.HTTPBadRequest()
@@ -3,17 +3,110 @@
 """
 
 import asyncio
+import collections
+import re
+import aiohttp
 import aiohttp.web
 import aiohttp_jinja2
 from aiohttp_session import get_session
 
 from auth.kancolle import KancolleAuth, OOIAuthException
+from base.trace import start_trace
 
 
 class FrontEndHandler:
     """OOI3前端请求处理类。"""
 
+    # 登录表单支持的游戏方式
+    modes = (1, 2, 3, 4)
+
+    # 允许写入页面的Host请求头：主机名、IPv4地址或方括号括起的IPv6地址，可以带端口；只用于防止在模板中插入HTML标记
+    host_pattern = re.compile(r'^([a-z0-9._-]+|\[[0-9a-f:.]+\])(:\d{1,5})?$')
+
+    # 缓存页面的用户数量上限，以及每个用户缓存的页面数量上限
+    max_cached_users = 1024
+    max_pages_per_user = 8
+
+    def __init__(self):
+        """ 构造函数，初始化页面缓存。
+        不依赖于用户的页面（登录表单和KCV页面）保存在`static_pages`中，其上下文只有游戏方式和固定的错误信息；游戏页面按api_token
+        分别保存在`user_pages`中，每个用户最多缓存`max_pages_per_user`个页面，用户数超过上限时淘汰最久未使用的用户，注销时删除。
+
+        :return: none
+        """
+        self.static_pages = {}
+        self.user_pages = collections.OrderedDict()
+
+    def prerender(self, env):
+        """ 预先渲染不依赖于用户的页面：各游戏方式下的登录表单和KCV页面。
+
+        :param env: jinja2.Environment
+        :return: none
+        """
+        for mode in self.modes:
+            self._render_static(env, 'form.html', {'mode': mode})
+        self._render_static(env, 'kcv.html', {})
+
+    def _render_static(self, env, template, context):
+        key = (template, ) + tuple(sorted(context.items()))
+        body = self.static_pages.get(key)
+        if body is None:
+            body = env.get_template(template).render(context).encode()
+            self.static_pages[key] = body
+        return body
+
+    def _response(self, body):
+        return aiohttp.web.Response(body=body, headers=aiohttp.MultiDict({'Content-Type': 'text/html; charset=utf-8'}))
+
+    def render(self, template, request, context):
+        """ 渲染不依赖于用户的模板`template`，相同的模板和上下文直接返回缓存的页面。
+
+        :param template: str
+        :param request: aiohttp.web.Request
+        :param context: dict
+        :return: aiohttp.web.Response
+        """
+        return self._response(self._render_static(aiohttp_jinja2.get_env(request.app), template, context))
+
+    def render_game(self, template, request, token, starttime):
+        """ 渲染用户的游戏页面，同一用户相同的模板、scheme、host和starttime直接返回缓存的页面。
+        没有Host请求头或其格式不正确时返回400错误。
+
+        :param template: str
+        :param request: aiohttp.web.Request
+        :param token: str
+        :param starttime: int
+        :return: aiohttp.web.Response
+        """
+        if request.host is None:
+            raise aiohttp.web.HTTPBadRequest()
+        host = request.host.lower()
+        if not self.host_pattern.match(host):
+            raise aiohttp.web.HTTPBadRequest()
+
+        pages = self.user_pages.get(token)
+        if pages is None:
+            pages = self.user_pages[token] = {}
+            if len(self.user_pages) > self.max_cached_users:
+                self.user_pages.popitem(last=False)
+        else:
+            self.user_pages.move_to_end(token)
+
+        key = (template, request.scheme, host, starttime)
+        body = pages.get(key)
+        if body is None:
+            if len(pages) >= self.max_pages_per_user:
+                pages.clear()
+            context = {'scheme': request.scheme,
+                       'host': host,
+                       'token': token,
+                       'starttime': starttime}
+            body = aiohttp_jinja2.get_env(request.app).get_template(template).render(context).encode()
+            pages[key] = body
+        return self._response(body)
+
     def clear_session(self, session):
+        self.user_pages.pop(session.get('api_token'), None)
         if 'api_token' in session:
             del session['api_token']
         if 'api_starttime' in session:
@@ -21,36 +114,49 @@ class FrontEndHandler:
         if 'world_ip' in session:
             del session['world_ip']
 
-    @aiohttp_jinja2.template('form.html')
     @asyncio.coroutine
     def form(self, request):
         """展示登录表单。
 
         :param request: aiohttp.web.Request
-        :return: dict
+        :return: aiohttp.web.Response
         """
         session = yield from get_session(request)
-        if 'mode' in session:
+        if session.get('mode') in self.modes:
             mode = session['mode']
         else:
             session['mode'] = 1
             mode = 1
 
-        return {'mode': mode}
+        return self.render('form.html', request, {'mode': mode})
 
     @asyncio.coroutine
     def login(self, request):
         """接受登录表单提交的数据，登录后跳转或登录失败后展示错误信息。
+        设定了慢请求阈值时，记录请求体解析、会话解码、DMM认证和写出响应各阶段的耗时。
 
         :param request: aiohttp.web.Request
         :return: aiohttp.web.HTTPFound or aiohttp.web.Response
         """
+        trace = start_trace('login')
+        response = yield from self._login(request, trace)
+        return trace.attach(response)
+
+    @asyncio.coroutine
+    def _login(self, request, trace):
         post = yield from request.post()
+        trace.mark('body_parse')
         session = yield from get_session(request)
+        trace.mark('session_decode')
 
         login_id = post.get('login_id', None)
         password = post.get('password', None)
-        mode = int(post.get('mode', 1))
+        try:
+            mode = int(post.get('mode', 1))
+        except ValueError:
+            raise aiohttp.web.HTTPBadRequest()
+        if mode not in self.modes:
+            raise aiohttp.web.HTTPBadRequest()
 
         session['mode'] = mode
 
@@ -59,6 +165,8 @@ class FrontEndHandler:
             if mode in (1, 2, 3):
                 try:
                     yield from kancolle.get_entry()
+                    trace.mark('upstream_auth')
+                    self.user_pages.pop(session.get('api_token'), None)
                     session['api_token'] = kancolle.api_token
                     session['api_starttime'] = kancolle.api_starttime
                     session['world_ip'] = kancolle.world_ip
@@ -70,21 +178,24 @@ class FrontEndHandler:
                         return aiohttp.web.HTTPFound('/kancolle')
 
                 except OOIAuthException as e:
+                    trace.mark('upstream_auth')
                     context = {'errmsg': e.message, 'mode': mode}
-                    return aiohttp_jinja2.render_template('form.html', request, context)
+                    return self.render('form.html', request, context)
             elif mode == 4:
                 try:
                     osapi_url = yield from kancolle.get_osapi()
+                    trace.mark('upstream_auth')
                     session['osapi_url'] = osapi_url
                     return aiohttp.web.HTTPFound('/connector')
                 except OOIAuthException as e:
+                    trace.mark('upstream_auth')
                     context = {'errmsg': e.message, 'mode': mode}
-                    return aiohttp_jinja2.render_template('form.html', request, context)
+                    return self.render('form.html', request, context)
             else:
                 raise aiohttp.web.HTTPBadRequest()
         else:
             context = {'errmsg': '请输入完整的登录ID和密码', 'mode': mode}
-            return aiohttp_jinja2.render_template('form.html', request, context)
+            return self.render('form.html', request, context)
 
     @asyncio.coroutine
     def normal(self, request):
@@ -99,11 +210,7 @@ class FrontEndHandler:
         starttime = session.get('api_starttime', None)
         world_ip = session.get('world_ip', None)
         if token and starttime and world_ip:
-            context = {'scheme': request.scheme,
-                       'host': request.host,
-                       'token': token,
-                       'starttime': starttime}
-            return aiohttp_jinja2.render_template('normal.html', request, context)
+            return self.render_game('normal.html', request, token, starttime)
         else:
             self.clear_session(session)
             return aiohttp.web.HTTPFound('/')
@@ -121,7 +228,7 @@ class FrontEndHandler:
         starttime = session.get('api_starttime', None)
         world_ip = session.get('world_ip', None)
         if token and starttime and world_ip:
-            return aiohttp_jinja2.render_template('kcv.html', request, context={})
+            return self.render('kcv.html', request, {})
         else:
             self.clear_session(session)
             return aiohttp.web.HTTPFound('/')
@@ -139,11 +246,7 @@ class FrontEndHandler:
         starttime = session.get('api_starttime', None)
         world_ip = session.get('world_ip', None)
         if token and starttime and world_ip:
-            context = {'scheme': request.scheme,
-                       'host': request.host,
-                       'token': token,
-                       'starttime': starttime}
-            return aiohttp_jinja2.render_template('flash.html', request, context)
+            return self.render_game('flash.html', request, token, starttime)
         else:
             self.clear_session(session)
             return aiohttp.web.HTTPFound('/')
@@ -161,11 +264,7 @@ class FrontEndHandler:
         starttime = session.get('api_starttime', None)
         world_ip = session.get('world_ip', None)
         if token and starttime and world_ip:
-            context = {'scheme': request.scheme,
-                       'host': request.host,
-                       'token': token,
-                       'starttime': starttime}
-            return aiohttp_jinja2.render_template('poi.html', request, context)
+            return self.render_game('poi.html', request, token, starttime)
         else:
             self.clear_session(session)
             return aiohttp.web.HTTPFound('/')
@@ -2,6 +2,7 @@
 
 import argparse
 import asyncio
+import os
 
 import jinja2
 import aiohttp.web
@@ -10,6 +11,7 @@ from aiohttp_session import session_middleware
 from aiohttp_session.cookie_storage import EncryptedCookieStorage
 
 from base import config
+from handlers.admin import AdminHandler
 from handlers.api import APIHandler
 from handlers.frontend import FrontEndHandler
 from handlers.service import ServiceHandler
@@ -21,24 +23,18 @@ parser.add_argument('-p', '--port', type=int, default=9999,
                     help='The port of OOI server')
 
 
-def main():
-    """OOI运行主函数。
+def make_app(loop):
+    """创建OOI的aiohttp应用，注册中间件、模板和路由。
 
-    :return: none
+    :param loop: asyncio.AbstractEventLoop
+    :return: aiohttp.web.Application
     """
 
-    # 解析命令行参数
-    args = parser.parse_args()
-    host = args.host
-    port = args.port
-
-    # 初始化事件循环
-    loop = asyncio.get_event_loop()
-
     # 初始化请求处理器
     api = APIHandler()
     frontend = FrontEndHandler()
     service = ServiceHandler()
+    admin = AdminHandler()
 
     # 定义会话中间件
     middlewares = [session_middleware(EncryptedCookieStorage(config.secret_key)), ]
@@ -46,8 +42,20 @@ def main():
     # 初始化应用
     app = aiohttp.web.Application(middlewares=middlewares, loop=loop)
 
-    # 定义Jinja2模板位置
-    aiohttp_jinja2.setup(app, loader=jinja2.FileSystemLoader(config.template_dir))
+    # 应用关闭时关闭抓取日志
+    app.on_shutdown.append(api.close)
+
+    # 定义Jinja2模板位置，编译后的模板保存在字节码缓存中，启动时预先编译所有模板并渲染静态页面
+    if config.template_cache_dir:
+        os.makedirs(config.template_cache_dir, mode=0o700, exist_ok=True)
+        bytecode_cache = jinja2.FileSystemBytecodeCache(config.template_cache_dir)
+    else:
+        bytecode_cache = jinja2.FileSystemBytecodeCache()
+    env = aiohttp_jinja2.setup(app, loader=jinja2.FileSystemLoader(config.template_dir),
+                               bytecode_cache=bytecode_cache, auto_reload=False)
+    for name in env.list_templates():
+        env.get_template(name)
+    frontend.prerender(env)
 
     # 给应用添加路由
     app.router.add_route('GET', '/', frontend.form)
@@ -63,11 +71,26 @@ def main():
     app.router.add_route('GET', '/kcs/resources/image/world/{server:.+}_{size:[lst]}.png', api.world_image)
     app.router.add_route('POST', '/service/osapi', service.get_osapi)
     app.router.add_route('POST', '/service/flash', service.get_flash)
+    app.router.add_route('POST', '/admin/profile', admin.profile)
+    app.router.add_route('GET', '/admin/slow', admin.slow)
     app.router.add_static('/static', config.static_dir)
     app.router.add_static('/kcs2', config.kcs2_dir)
     app.router.add_static('/_kcs2', config.kcs2_dir)
     app.router.add_static('/kcs', config.kcs_dir)
     app.router.add_static('/_kcs', config.kcs_dir)
+
+    return app
+
+
+def serve(app, loop, host, port):
+    """在`host`和`port`上运行OOI应用，直到收到KeyboardInterrupt。
+
+    :param app: aiohttp.web.Application
+    :param loop: asyncio.AbstractEventLoop
+    :param host: str
+    :param port: int
+    :return: none
+    """
     app_handlers = app.make_handler()
 
     # 启动OOI服务器
@@ -78,11 +101,30 @@ def main():
     except KeyboardInterrupt:
         pass
     finally:
+        loop.run_until_complete(app.shutdown())
         loop.run_until_complete(app_handlers.finish_connections(1.0))
         server.close()
         loop.run_until_complete(server.wait_closed())
         loop.run_until_complete(app.cleanup())
     loop.close()
 
+
+def main():
+    """OOI运行主函数。
+
+    :return: none
+    """
+
+    # 解析命令行参数
+    args = parser.parse_args()
+    host = args.host
+    port = args.port
+
+    # 初始化事件循环
+    loop = asyncio.get_event_loop()
+
+    app = make_app(loop)
+    serve(app, loop, host, port)
+
 if __name__ == '__main__':
     main()